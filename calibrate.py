@@ -0,0 +1,24 @@
+import json
+import os
+import sys
+
+from helpers.telemetry import calibrate_thresholds
+
+base_path = os.getcwd()
+
+if __name__ == '__main__':
+    move_detector_path = os.path.join(base_path, "data", "move_detector")
+    telemetry_path = os.path.join(move_detector_path, "telemetry.json")
+    if not os.path.exists(telemetry_path):
+        sys.exit(
+            f"No detection telemetry found in {telemetry_path}: play the game at "
+            "least once before calibrating the thresholds"
+        )
+    # Read the detection telemetry saved by the game
+    with open(telemetry_path, "r") as f:
+        snapshot = json.load(f)
+    # Pick the per class thresholds and save them for the move detector
+    thresholds = calibrate_thresholds(snapshot)
+    with open(os.path.join(move_detector_path, "thresholds.json"), "w") as f:
+        json.dump(thresholds, f)
+    print(thresholds)
@@ -0,0 +1,247 @@
+import math
+import random
+import time
+
+from .moves import MovesEnum
+
+# Table of the points: POINT_TABLE[user_move][bot_move] is the user point
+POINT_TABLE = (
+    (0, -1, 1),
+    (1, 0, -1),
+    (-1, 1, 0),
+)
+
+# Precomputed lookup: COUNTER_MOVES[move] is the move that defeats "move"
+COUNTER_MOVES = tuple(row.index(-1) for row in POINT_TABLE)
+
+# Precomputed lookup: BOT_REWARDS[user_move][bot_move] is the bot point
+BOT_REWARDS = tuple(tuple(-point for point in row) for row in POINT_TABLE)
+
+MOVES = tuple(map(int, MovesEnum.__iter__()))
+
+
+class FrequencyPredictor:
+    """
+    Predicts that the user will play their most played move
+    """
+
+    name = "frequency"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0, 0, 0]
+        self.total = 0
+
+    def update(self, user_move):
+        self.counts[user_move] += 1
+        self.total += 1
+
+    def predict(self):
+        if not self.total:
+            return
+        return max(MOVES, key=self.counts.__getitem__)
+
+    def is_affordable(self, remaining_time):
+        # O(1) prediction, always affordable
+        return True
+
+
+class LastMovePredictor:
+    """
+    Predicts that the user will play again their last move
+    """
+
+    name = "last_move"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last_move = None
+
+    def update(self, user_move):
+        self.last_move = user_move
+
+    def predict(self):
+        return self.last_move
+
+    def is_affordable(self, remaining_time):
+        # O(1) prediction, always affordable
+        return True
+
+
+class MarkovPredictor:
+    """
+    Predicts the user move that most often followed their last move (first order
+    Markov chain)
+    """
+
+    name = "markov"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transitions = [[0, 0, 0] for _ in MOVES]
+        self.last_move = None
+
+    def update(self, user_move):
+        if self.last_move is not None:
+            self.transitions[self.last_move][user_move] += 1
+        self.last_move = user_move
+
+    def predict(self):
+        if self.last_move is None:
+            return
+        row = self.transitions[self.last_move]
+        if not any(row):
+            return
+        return max(MOVES, key=row.__getitem__)
+
+    def is_affordable(self, remaining_time):
+        # O(1) prediction, always affordable
+        return True
+
+
+class LSTMPredictor:
+    """
+    Wraps the NextMovePredictor built in the second part of this tutorial. Its cost
+    grows with the played moves, so the selector skips it when its last measured
+    prediction time doesn't fit the latency budget. A too slow LSTM is measured again
+    after the round, waiting twice the rounds every time it's still too slow
+    """
+
+    name = "lstm"
+
+    def __init__(self, next_move_predictor, latency_budget, max_retry_backoff=32):
+        self.next_move_predictor = next_move_predictor
+        # Max seconds available to choose the bot move
+        self.latency_budget = latency_budget
+        # Max rounds to wait before measuring again a too slow LSTM
+        self.max_retry_backoff = max_retry_backoff
+        # Unknown until measured: the first prediction also warms the model up
+        self.estimated_time = math.inf
+        # Rounds to wait before the next measure and how many to wait after it
+        self.rounds_to_retry = 0
+        self.retry_backoff = 1
+
+    def reset(self):
+        # The wrapped predictor is trained and reset by the Game
+        pass
+
+    def _timed_predict(self):
+        start = time.perf_counter()
+        move = int(self.next_move_predictor.predict_next_move())
+        self.estimated_time = time.perf_counter() - start
+        if self.estimated_time > self.latency_budget:
+            # Too slow: wait more and more rounds before measuring again
+            self.rounds_to_retry = self.retry_backoff
+            self.retry_backoff = min(2 * self.retry_backoff, self.max_retry_backoff)
+        else:
+            self.retry_backoff = 1
+        return move
+
+    def update(self, user_move):
+        # A too slow LSTM is measured again only when its backoff is over, so it's
+        # retried only when a measure says it's fast enough
+        if (
+            not self.next_move_predictor.played_moves
+            or self.estimated_time <= self.latency_budget
+        ):
+            return
+        if self.rounds_to_retry:
+            self.rounds_to_retry -= 1
+            return
+        self._timed_predict()
+
+    def is_affordable(self, remaining_time):
+        return self.estimated_time <= remaining_time
+
+    def predict(self):
+        if not self.next_move_predictor.played_moves:
+            return
+        return self._timed_predict()
+
+
+class BotStrategySelector:
+    """
+    Runs several user move predictors side by side and weights their votes with a
+    Hedge (multiplicative weights) update based on the recent rounds. Only the
+    predictions done within "latency_budget" seconds vote, the cheapest one always
+    """
+
+    def __init__(
+        self,
+        next_move_predictor=None,
+        latency_budget=0.05,
+        learning_rate=0.5,
+        decay=0.9,
+    ):
+        # Predictors sorted from the cheapest to the most expensive
+        self.predictors = [FrequencyPredictor(), LastMovePredictor(), MarkovPredictor()]
+        if next_move_predictor is not None:
+            self.predictors.append(LSTMPredictor(next_move_predictor, latency_budget))
+        # Max seconds available to choose the bot move
+        self.latency_budget = latency_budget
+        # How fast the weights follow the predictors outcomes
+        self.learning_rate = learning_rate
+        # How much the past rounds count: 1 never forgets, 0 only the last round
+        self.decay = decay
+        self.reset()
+
+    def reset(self):
+        for predictor in self.predictors:
+            predictor.reset()
+        # Log weights are used to keep the Hedge update numerically stable
+        self.log_weights = [0.0] * len(self.predictors)
+        # Moves predicted by each predictor in the last round (None if not voted)
+        self.last_predictions = [None] * len(self.predictors)
+
+    def _vote(self, start):
+        # Collect the predictions of the predictors that fit in the latency budget
+        predictions = [None] * len(self.predictors)
+        for i, predictor in enumerate(self.predictors):
+            remaining_time = self.latency_budget - (time.perf_counter() - start)
+            if i and remaining_time <= 0:
+                # Budget exceeded -> keep the predictions done in time, at least the
+                # cheapest one
+                break
+            if not predictor.is_affordable(remaining_time):
+                continue
+            predictions[i] = predictor.predict()
+            if i and time.perf_counter() - start > self.latency_budget:
+                # Late prediction, it's dropped
+                predictions[i] = None
+                break
+        return predictions
+
+    def choose_move(self):
+        start = time.perf_counter()
+        self.last_predictions = self._vote(start)
+        # Every predictor votes for the move that defeats its predicted user move
+        max_log_weight = max(self.log_weights)
+        votes = [0.0, 0.0, 0.0]
+        for log_weight, prediction in zip(self.log_weights, self.last_predictions):
+            if prediction is not None:
+                votes[COUNTER_MOVES[prediction]] += math.exp(
+                    log_weight - max_log_weight
+                )
+        if not any(votes):
+            return random.choice(MOVES)
+        return max(MOVES, key=votes.__getitem__)
+
+    def update(self, user_move):
+        user_move = int(user_move)
+        # Hedge update: reward the predictors whose counter move would have won
+        for i, prediction in enumerate(self.last_predictions):
+            self.log_weights[i] *= self.decay
+            if prediction is not None:
+                bot_move = COUNTER_MOVES[prediction]
+                self.log_weights[i] += (
+                    self.learning_rate * BOT_REWARDS[user_move][bot_move]
+                )
+        self.last_predictions = [None] * len(self.predictors)
+        for predictor in self.predictors:
+            predictor.update(user_move)
@@ -4,8 +4,11 @@ import re
 import cv2
 import pygame
 
+from .bot_strategy import POINT_TABLE, BotStrategySelector
+from .game_state import GameStateEnum, GameStateMachine
 from .move_detection import RockPaperScissorsPredictor, MovesEnum
 from .next_move_prediction import NextMovePredictor
+from .telemetry import DetectionTelemetry
 from .webcam import opencv_video_capture, opencv_to_pygame_image
 
 base_path = os.getcwd()
@@ -48,12 +51,11 @@ class Game:
     PLAYINGWITHAI_COLOR = (66, 153, 225)
     PLAYINGWITHAI_DARK_COLOR = (56, 143, 215)
 
+    # Start game button position and size: (x, y, width, height)
+    START_BUTTON = (355, 500, 90, 50)
+
     # Table of the points
-    point_table = [
-        [0, -1, 1],
-        [1, 0, -1],
-        [-1, 1, 0],
-    ]
+    point_table = POINT_TABLE
 
     def __init__(
         self,
@@ -62,6 +64,8 @@ class Game:
         webcam_index=0,
         min_repeated_move_detection=30,
         no_detection_period=5,
+        bot_latency_budget=0.05,
+        idle_fps=30,
     ):
         # create dir that contains all the data of this project
         self._create_data_dir()
@@ -89,26 +93,36 @@ class Game:
         self.last_user_move = None
         # How many times a move is repeatedly detected
         self.repeated_move_detection_counter = 0
-        # Seconds with no move detection between rounds
-        self.no_detection_rounds = self.no_detection_period
+        # Frame rate of the main cycle when no move detection is running
+        self.idle_fps = idle_fps
+        # The game flow: countdown -> detecting -> resolving -> result -> countdown
+        # or game over
+        self.state_machine = GameStateMachine(self.no_detection_period)
         # Init of the user next move predictor built in the second part of this tutorial
         # https://playingwith.ai/blog/morra-cinese-contro-ia-parte2.html
         self.user_next_move_predictor = NextMovePredictor()
+        # Ensemble of cheap predictors and the LSTM that chooses the bot move within
+        # "bot_latency_budget" seconds
+        self.bot_strategy = BotStrategySelector(
+            self.user_next_move_predictor, latency_budget=bot_latency_budget
+        )
         # Init of the move detector built in the first part of this tutorial:
         # https://playingwith.ai/blog/morra-cinese-contro-ia-parte1.html
-        self.move_detector = RockPaperScissorsPredictor()
+        self.detection_telemetry = DetectionTelemetry()
+        self.move_detector = RockPaperScissorsPredictor(
+            telemetry=self.detection_telemetry
+        )
+        # Paths of the detection telemetry exports, used by calibrate.py
+        self.telemetry_json_path = os.path.join(
+            base_path, "data", "move_detector", "telemetry.json"
+        )
+        self.telemetry_prometheus_path = os.path.join(
+            base_path, "data", "move_detector", "telemetry.prom"
+        )
         # Prevent tensorflow to load during the first detection
         self.move_detector_load_needed = True
         # Main cycle variable, if False the game will quit
         self.running = True
-        # True if a user is playing
-        self.playing = False
-        # True when user lost the game
-        self.lost = True
-        # If true hand detection must be stopped
-        self.stop_detection = False
-        # The last round user point
-        self.last_user_point = None
         # Path for the file that contains the high score
         self.score_dir_path = os.path.join(base_path, "data", "score")
         # Get high score from stored file
@@ -135,30 +149,22 @@ class Game:
         self.SOUND_FIGHT = pygame.mixer.Sound(
             os.path.join(base_path, "assets", "audio", "fight.wav")
         )
-        # This variable prevent the round start sound to be played more than once per
-        # round
-        self.PLAY_FIGHT = True
         # Sound 3 second countdown
         self.SOUND_3 = pygame.mixer.Sound(
             os.path.join(base_path, "assets", "audio", "3.wav")
         )
-        # This variable prevent the 3 second countdown sound to be played more than
-        # once per round
-        self.play_3 = True
         # Sound 2 second countdown
         self.SOUND_2 = pygame.mixer.Sound(
             os.path.join(base_path, "assets", "audio", "2.wav")
         )
-        # This variable prevent the 2 second countdown sound to be played more than
-        # once per round
-        self.play_2 = True
         # Sound 1 second countdown
         self.SOUND_1 = pygame.mixer.Sound(
             os.path.join(base_path, "assets", "audio", "1.wav")
         )
-        # This variable prevent the 1 second countdown sound to be played more than
-        # once per round
-        self.play_1 = True
+        # Sounds played when the countdown reaches the seconds of the key
+        self.COUNTDOWN_SOUNDS = {3: self.SOUND_3, 2: self.SOUND_2, 1: self.SOUND_1}
+        # Game logic runs only on state machine transitions
+        self._bind_state_machine()
 
     def _get_high_score(self):
         # Get high score from score.txt file if exists
@@ -211,11 +217,6 @@ class Game:
         pygame.display.set_icon(self.ICON_IMAGE)
         pygame.display.set_caption("Rock Paper Scissors against an AI")
 
-    @staticmethod
-    def _set_one_second_timer():
-        # pygame 1s timer
-        pygame.time.set_timer(pygame.USEREVENT, 1000)
-
     def _init_pygame(self):
         # required by pygame
         pygame.init()
@@ -223,8 +224,15 @@ class Game:
         self._set_window_icon_and_title()
         # set the pygame screen resolution
         self.screen = self._set_screen()
-        # set a custom 1s timer
-        self._set_one_second_timer()
+        # clock used to limit the frame rate of the main cycle
+        self.clock = pygame.time.Clock()
+
+    def _bind_state_machine(self):
+        self.state_machine.on_countdown(self._on_countdown)
+        self.state_machine.on_enter(GameStateEnum.DETECTING, self._on_detecting)
+        self.state_machine.on_enter(GameStateEnum.RESOLVING, self._play_round)
+        self.state_machine.on_enter(GameStateEnum.RESULT, self._show_result)
+        self.state_machine.on_enter(GameStateEnum.GAME_OVER, self._end_game)
 
     def _show_centered_text(
         self, caption, font, frame_width, height, color, width_span=0.0
@@ -241,33 +249,28 @@ class Game:
 
     def _new_game(self):
         # Restart a game resetting variables
-        self.playing = True
-        self.lost = False
         self.last_user_move = None
         self.last_bot_move = None
-        self.no_detection_rounds = self.no_detection_period
+        self.state_machine.start()
 
-    def _show_start_game_button(self, x=355, y=500, width=90, height=50):
+    def _is_over_start_button(self, position):
+        x, y, width, height = self.START_BUTTON
+        return x + width > position[0] > x and y + height > position[1] > y
+
+    def _show_start_game_button(self):
         # Start game button is visible only if we're playing the first game or the
         # game is lost
-        if self.lost:
-            # get the mouse position
-            mouse = pygame.mouse.get_pos()
-            # get if mouse is pressed
-            click = pygame.mouse.get_pressed()
+        if self.state_machine.state == GameStateEnum.GAME_OVER:
             # if mouse is over the start button
-            if x + width > mouse[0] > x and y + height > mouse[1] > y:
+            if self._is_over_start_button(pygame.mouse.get_pos()):
                 # Start button will be rendered with a darken color
                 pygame.draw.rect(
-                    self.screen, self.PLAYINGWITHAI_DARK_COLOR, (x, y, width, height)
+                    self.screen, self.PLAYINGWITHAI_DARK_COLOR, self.START_BUTTON
                 )
-                # If start button is clicked, start a new game
-                if click[0] == 1:
-                    self._new_game()
             else:
                 # No mouse over the start button, default rendering
                 pygame.draw.rect(
-                    self.screen, self.PLAYINGWITHAI_COLOR, (x, y, width, height)
+                    self.screen, self.PLAYINGWITHAI_COLOR, self.START_BUTTON
                 )
             # Display the "Play" text inside the start button
             self._show_centered_text(
@@ -309,8 +312,8 @@ class Game:
         # If a move is detected repeatedly for more than
         # min_repeated_move_detection -> stop the move detection and play a round
         if self.repeated_move_detection_counter > self.min_repeated_move_detection:
-            self.stop_detection = True
-            self._play_round()
+            self.detection_telemetry.confirm_round(self.last_user_move)
+            self.state_machine.move_confirmed()
 
     def _handle_user_image_acquisition_and_detection(self):
         # Get webcam frame
@@ -318,11 +321,10 @@ class Game:
         if self.move_detector_load_needed:
             # Tensorflow needs a lot of time for the init, so we do a false detection to
             # load it in the first cycle
-            self.move_detector.detect_move_from_picture(user_webcam_image)
+            self.move_detector.detect_move_from_picture(user_webcam_image, record=False)
             self.move_detector_load_needed = False
-        # Move detection must be done only if user is playing, if detection is
-        # allowed and if no_detection_rounds are less or equal 0
-        if self.playing and not self.stop_detection and self.no_detection_rounds <= 0:
+        # Move detection must be done only after the round countdown
+        if self.state_machine.state == GameStateEnum.DETECTING:
             self._handle_user_move_detection(user_webcam_image)
 
         # pygame needs some image conversion to properly display the frame acquired
@@ -365,9 +367,9 @@ class Game:
 
     def _show_round_countdown(self):
         # Display the round countdown in the user webcam frame
-        if self.playing and self.no_detection_rounds > 0:
+        if self.state_machine.state == GameStateEnum.COUNTDOWN:
             self._show_centered_text(
-                str(self.no_detection_rounds),
+                str(self.state_machine.countdown),
                 self.font_title,
                 self.screen_width / 2,
                 300,
@@ -393,56 +395,48 @@ class Game:
         # Quit the game
         self.running = False
 
-    def _sounds(self):
-        # It handles the game sounds
-        if self.playing:
-            if self.PLAY_FIGHT and self.no_detection_rounds == 0:
-                self.SOUND_FIGHT.play()
-                self.PLAY_FIGHT = False
-            elif self.play_3 and self.no_detection_rounds == 3:
-                self.SOUND_3.play()
-                self.play_3 = False
-            elif self.play_2 and self.no_detection_rounds == 2:
-                self.SOUND_2.play()
-                self.play_2 = False
-            elif self.play_1 and self.no_detection_rounds == 1:
-                self.SOUND_1.play()
-                self.play_1 = False
-
-    def _reset_bot_move(self):
+    def _on_countdown(self, seconds):
+        # It plays the countdown sounds
+        if seconds in self.COUNTDOWN_SOUNDS:
+            self.COUNTDOWN_SOUNDS[seconds].play()
         # Every round the last bot move is hidden before the new one is played
-        if self.no_detection_rounds == 1:
+        if seconds == 1:
             self.last_bot_move = None
 
-    def _reset_sounds(self):
-        # Reset all sounds at the end of every round
-        self.PLAY_FIGHT = True
-        self.play_3 = True
-        self.play_2 = True
-        self.play_1 = True
+    def _on_detecting(self):
+        # Round start: play the sound and start a new move detection
+        self.SOUND_FIGHT.play()
+        self.repeated_move_detection_counter = 0
+        self.detection_telemetry.start_round()
+
+    def _handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self._quit_game()
+        # If start button is clicked, start a new game
+        if (
+            event.type == pygame.MOUSEBUTTONDOWN
+            and event.button == 1
+            and self.state_machine.state == GameStateEnum.GAME_OVER
+            and self._is_over_start_button(event.pos)
+        ):
+            self._new_game()
 
     def _check_events(self):
         # Handle pygame events
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self._quit_game()
-            if event.type == pygame.USEREVENT:
-                # this event is raised every 1s
-                if self.playing and not self.stop_detection:
-                    self.no_detection_rounds -= 1
+            self._handle_event(event)
 
     def _set_background_color(self):
         self.screen.fill(self.WHITE)
 
     def _get_bot_move(self):
         # Get the move that defeat the predicted user move
-        return self.point_table[
-            self.user_next_move_predictor.predict_next_move()
-        ].index(-1)
+        return self.bot_strategy.choose_move()
 
     def _update_bot(self, user_move):
         # Train bot with the new user move
         self.user_next_move_predictor.train(user_move)
+        self.bot_strategy.update(user_move)
 
     def _update_score(self, user_point):
         self.current_score += max(0, user_point)
@@ -453,54 +447,39 @@ class Game:
 
     def _end_game(self):
         self.SOUND_LOST.play()
-        self.lost = True
         self.high_score = max(self.high_score, self.current_score)
         self.current_score = 0
         # Save high score if is higher of the old one
         self._set_high_score()
         # Reset the played move for user move predictions
         self.user_next_move_predictor.reset_played_moves()
+        self.bot_strategy.reset()
 
-    def _show_result(self):
-        if self.last_user_point is None:
-            return
-
+    def _show_result(self, user_point):
         # Update the user score
-        self._update_score(self.last_user_point)
-        # if user loses stop the game
-        if self.last_user_point == -1:
-            self._end_game()
-        else:
-            # play proper sound
-            if self.last_user_point == 1:
-                self.SOUND_WIN.play()
-            else:
-                self.SOUND_DRAW.play()
-            # Reset no detection rounds
-            self.no_detection_rounds = self.no_detection_period
-            # reset repeated_move_detection_counter
-            self.repeated_move_detection_counter = 0
-            # Game can continue
-            self.playing = True
-        # Reset last_user_point
-        self.last_user_point = None
-        self._reset_sounds()
-        # detection allowed
-        self.stop_detection = False
+        self._update_score(user_point)
+        # play proper sound, the lost sound is played at the end of the game
+        if user_point == 1:
+            self.SOUND_WIN.play()
+        elif user_point == 0:
+            self.SOUND_DRAW.play()
 
     def _play_round(self):
-        if not self.playing:
-            return
-        # pause playing
-        self.playing = False
         # Get the move that bot wants to play
         self.last_bot_move = self._get_bot_move()
         # Calculate the user point
-        self.last_user_point = self._get_user_round_point(
+        user_point = self._get_user_round_point(
             self.last_user_move, self.last_bot_move
         )
         # Train the bot with the last round
         self._update_bot(self.last_user_move)
+        self.state_machine.round_resolved(user_point)
+
+    def _wait_next_frame(self):
+        # Move detection runs as fast as possible, otherwise only the webcam
+        # preview changes between the events, so the cycle sleeps
+        if self.state_machine.state != GameStateEnum.DETECTING:
+            self.clock.tick(self.idle_fps)
 
     # Main game cycle
     def run(self):
@@ -508,12 +487,14 @@ class Game:
             with opencv_video_capture(self.webcam_index) as camera:
                 self.camera = camera
                 while self.running:
-                    self._reset_bot_move()
                     self._set_background_color()
                     self._check_events()
+                    self.state_machine.update()
                     self._show_gui_elements()
-                    self._show_result()
-                    self._sounds()
                     pygame.display.update()
+                    self._wait_next_frame()
         finally:
             self.user_next_move_predictor.save_model()
+            self.detection_telemetry.save(
+                self.telemetry_json_path, self.telemetry_prometheus_path
+            )
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+from enum import Enum
+
+
+class GameStateEnum(Enum):
+    COUNTDOWN = 0
+    DETECTING = 1
+    RESOLVING = 2
+    RESULT = 3
+    GAME_OVER = 4
+
+
+class GameStateMachine:
+    """
+    This class drives the game flow (countdown -> detecting -> resolving -> result ->
+    countdown or game over) with timers and events. Callbacks run only on
+    transitions, so nothing has to be polled on every frame. The caller only has to
+    call update() when time_to_next_event() expires
+    """
+
+    # Allowed transitions: state -> states reachable from it
+    TRANSITIONS = {
+        GameStateEnum.GAME_OVER: {GameStateEnum.COUNTDOWN},
+        GameStateEnum.COUNTDOWN: {GameStateEnum.DETECTING},
+        GameStateEnum.DETECTING: {GameStateEnum.RESOLVING},
+        GameStateEnum.RESOLVING: {GameStateEnum.RESULT},
+        GameStateEnum.RESULT: {GameStateEnum.COUNTDOWN, GameStateEnum.GAME_OVER},
+    }
+
+    def __init__(self, countdown_period=5, result_period=1, clock=time.monotonic):
+        # Seconds of countdown before every round
+        self.countdown_period = countdown_period
+        # Seconds the round result is shown before the next round or the game over
+        self.result_period = result_period
+        # Function that returns the current time in seconds
+        self.clock = clock
+        # A game is not started until the user asks for it
+        self.state = GameStateEnum.GAME_OVER
+        # Seconds left before the move detection starts
+        self.countdown = countdown_period
+        # User point of the last round, it decides the state after the result
+        self.user_point = None
+        # Time the running timer expires, None if no timer is running
+        self.deadline = None
+        # Callbacks called when a state is entered
+        self.enter_callbacks = {state: [] for state in GameStateEnum}
+        # Callbacks called every countdown second with the seconds left
+        self.countdown_callbacks = []
+        # Transitions requested while callbacks are running, done after them
+        self.pending_transitions = deque()
+
+    def on_enter(self, state, callback):
+        self.enter_callbacks[state].append(callback)
+
+    def on_countdown(self, callback):
+        self.countdown_callbacks.append(callback)
+
+    def _next_state(self):
+        # The state the machine will be in once the pending transitions are done
+        if self.pending_transitions:
+            return self.pending_transitions[-1][0]
+        return self.state
+
+    def _transition(self, state, *args):
+        if state not in self.TRANSITIONS[self._next_state()]:
+            raise ValueError(
+                f"Transition from {self._next_state()} to {state} not allowed"
+            )
+        self.pending_transitions.append((state, args))
+        if len(self.pending_transitions) > 1:
+            # Called by a callback: the transition is done after the running ones
+            return
+        while self.pending_transitions:
+            state, args = self.pending_transitions[0]
+            self.state = state
+            if state == GameStateEnum.COUNTDOWN:
+                # Start the countdown timer
+                self.countdown = self.countdown_period
+                self.deadline = self.clock() + 1
+            elif state == GameStateEnum.RESULT:
+                # Start the result timer
+                self.deadline = self.clock() + self.result_period
+            else:
+                self.deadline = None
+            for callback in self.enter_callbacks[state]:
+                callback(*args)
+            self.pending_transitions.popleft()
+
+    def start(self):
+        # Start a new game
+        if self._next_state() == GameStateEnum.GAME_OVER:
+            self._transition(GameStateEnum.COUNTDOWN)
+
+    def move_confirmed(self):
+        # The user move is detected, the round can be played
+        if self._next_state() == GameStateEnum.DETECTING:
+            self._transition(GameStateEnum.RESOLVING)
+
+    def round_resolved(self, user_point):
+        # Show the round result, the game goes on only if user didn't lose
+        if self._next_state() == GameStateEnum.RESOLVING:
+            self.user_point = user_point
+            self._transition(GameStateEnum.RESULT, user_point)
+
+    def time_to_next_event(self):
+        # Seconds before the running timer expires, None if no timer is running
+        if self.deadline is None:
+            return
+        return max(0.0, self.deadline - self.clock())
+
+    def _countdown_tick(self, now):
+        self.countdown -= 1
+        self.deadline += 1
+        if self.deadline <= now:
+            # After a stall the missed ticks are skipped, not fired all together
+            self.deadline = now + 1
+        for callback in self.countdown_callbacks:
+            callback(self.countdown)
+        if self.countdown <= 0:
+            self._transition(GameStateEnum.DETECTING)
+
+    def _result_shown(self):
+        if self.user_point == -1:
+            self._transition(GameStateEnum.GAME_OVER)
+        else:
+            self._transition(GameStateEnum.COUNTDOWN)
+
+    def update(self):
+        # Handle the expired timers
+        now = self.clock()
+        while self.deadline is not None and now >= self.deadline:
+            if self.state == GameStateEnum.COUNTDOWN:
+                self._countdown_tick(now)
+            else:
+                self._result_shown()
@@ -1,19 +1,16 @@
+import json
 import logging
 import os
 from enum import Enum
 
 from imageai.Prediction.Custom import CustomImagePrediction
 
+from .moves import DEFAULT_SENSIBILITY, MovesEnum
+
 # Show only errors in console
 logging.getLogger("tensorflow").setLevel(logging.ERROR)
 
 
-class MovesEnum(int, Enum):
-    ROCK = 0
-    PAPER = 1
-    SCISSORS = 2
-
-
 class ModelTypeEnum(Enum):
     """
     An helper enum to help for model type choice
@@ -48,10 +45,17 @@ class RockPaperScissorsPredictor:
             self,
             model_type=ModelTypeEnum.RESNET,
             class_number=3,  # We have 3 different objects: "rock", "paper", "scissors"
+            telemetry=None,
     ):
         self.model_type = model_type
         self.class_number = class_number
         self.base_path = os.getcwd()
+        # Optional DetectionTelemetry that records the confidence of every frame
+        self.telemetry = telemetry
+        # Per class thresholds chosen by calibrate.py, they override sensibility
+        self.thresholds = self._load_thresholds(
+            os.path.join(self.base_path, "data", "move_detector", "thresholds.json")
+        )
         # Instantiate the CustomImagePrediction object that will predict our moves
         self.predictor = CustomImagePrediction()
         # Set the model type of the neural network (it must be the same of the training)
@@ -70,7 +74,21 @@ class RockPaperScissorsPredictor:
     def _set_proper_model_type(self, model_type):
         self.MODEL_TYPE_SET_LOOKUP[model_type](self.predictor)
 
-    def detect_move_from_picture(self, picture, sensibility=90):
+    @staticmethod
+    def _load_thresholds(thresholds_path):
+        if not os.path.exists(thresholds_path):
+            return {}
+        with open(thresholds_path, "r") as f:
+            return json.load(f)
+
+    def detect_move_from_picture(
+            self, picture, sensibility=DEFAULT_SENSIBILITY, record=True
+    ):
+        """
+        Return the detected move, or None if its probability is under the threshold.
+        The threshold is the calibrated one of the move if thresholds.json has it,
+        otherwise "sensibility". record=False keeps the frame out of telemetry
+        """
         predictions, probabilities = self.predictor.predictImage(
             picture, result_count=3, input_type="array"
         )
@@ -79,7 +97,13 @@ class RockPaperScissorsPredictor:
         best_prediction = max(
             zip(predictions, probabilities), key=lambda x: x[1]
         )
-        if best_prediction[1] < sensibility:
+        move = self.MOVES_LOOKUP[best_prediction[0]]
+        accepted = best_prediction[1] >= self.thresholds.get(
+            best_prediction[0], sensibility
+        )
+        if record and self.telemetry is not None:
+            self.telemetry.record_frame(move, best_prediction[1], accepted)
+        if not accepted:
             return
 
-        return self.MOVES_LOOKUP[best_prediction[0]]
+        return move
@@ -0,0 +1,11 @@
+from enum import Enum
+
+# Min probability (0-100) of a detected move, used when a move has no calibrated
+# threshold in data/move_detector/thresholds.json
+DEFAULT_SENSIBILITY = 90
+
+
+class MovesEnum(int, Enum):
+    ROCK = 0
+    PAPER = 1
+    SCISSORS = 2
@@ -0,0 +1,264 @@
+import json
+import math
+import os
+import time
+
+from .moves import DEFAULT_SENSIBILITY, MovesEnum
+
+
+class DetectionTelemetry:
+    """
+    This class collects the move detection confidence, the rejection rate and the
+    time needed to confirm a move. Counters are plain lists written only by the
+    detection loop, so no lock is needed and recording a frame is O(1)
+    """
+
+    # Upper bounds (seconds) of the time-to-confirmation histogram buckets
+    CONFIRMATION_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, math.inf)
+
+    def __init__(self, bin_width=5, clock=time.monotonic):
+        # Width of the confidence histogram buckets (probabilities are 0-100)
+        self.bin_width = bin_width
+        # Function that returns the current time in seconds
+        self.clock = clock
+        # Lower bounds of the confidence histogram buckets: a bucket contains the
+        # probabilities p with lower bound <= p < next lower bound, like the
+        # "probability >= threshold" check of the move detector
+        self.confidence_buckets = tuple(range(0, 100 + bin_width, bin_width))
+        self.reset()
+
+    def _empty_histograms(self):
+        return {move: [0] * len(self.confidence_buckets) for move in MovesEnum}
+
+    def reset(self):
+        # Confidence of the best prediction of every frame, by predicted move
+        self.confidence = self._empty_histograms()
+        # Sum of the confidences, by predicted move
+        self.confidence_sum = {move: 0.0 for move in MovesEnum}
+        # Confidence of the frames whose move is the one confirmed in the round
+        self.confirmed_confidence = self._empty_histograms()
+        # Confidence of the frames whose move differs from the confirmed one
+        self.unconfirmed_confidence = self._empty_histograms()
+        # Frames rejected because under the threshold, by predicted move
+        self.rejected = {move: 0 for move in MovesEnum}
+        # Time needed to confirm a move
+        self.confirmation_time = [0] * len(self.CONFIRMATION_BUCKETS)
+        self.confirmation_time_sum = 0.0
+        # Frames of the current round, not labeled yet
+        self.round_confidence = self._empty_histograms()
+        self.round_start = None
+
+    def _confidence_bucket(self, probability):
+        # Index of the bucket with the biggest lower bound <= probability
+        return min(
+            max(0, math.floor(probability / self.bin_width)),
+            len(self.confidence_buckets) - 1,
+        )
+
+    def start_round(self):
+        # Move detection started: clear the round frames and start the timer
+        for histogram in self.round_confidence.values():
+            histogram[:] = [0] * len(histogram)
+        self.round_start = self.clock()
+
+    def record_frame(self, move, probability, accepted):
+        bucket = self._confidence_bucket(probability)
+        self.confidence[move][bucket] += 1
+        self.confidence_sum[move] += probability
+        self.round_confidence[move][bucket] += 1
+        if not accepted:
+            self.rejected[move] += 1
+
+    def confirm_round(self, move):
+        # Label the round frames with the confirmed move
+        if self.round_start is None:
+            return
+        for frame_move, histogram in self.round_confidence.items():
+            labeled = (
+                self.confirmed_confidence
+                if frame_move == move
+                else self.unconfirmed_confidence
+            )
+            for bucket, count in enumerate(histogram):
+                labeled[frame_move][bucket] += count
+        elapsed = self.clock() - self.round_start
+        self.confirmation_time_sum += elapsed
+        for bucket, upper_bound in enumerate(self.CONFIRMATION_BUCKETS):
+            if elapsed <= upper_bound:
+                self.confirmation_time[bucket] += 1
+                break
+        self.round_start = None
+
+    def snapshot(self):
+        # A JSON serializable copy of the counters
+        def histograms(data):
+            return {move.name.lower(): list(counts) for move, counts in data.items()}
+
+        return {
+            "confidence_buckets": list(self.confidence_buckets),
+            "confidence": histograms(self.confidence),
+            "confidence_sum": {
+                move.name.lower(): total for move, total in self.confidence_sum.items()
+            },
+            "confirmed_confidence": histograms(self.confirmed_confidence),
+            "unconfirmed_confidence": histograms(self.unconfirmed_confidence),
+            "rejected": {move.name.lower(): n for move, n in self.rejected.items()},
+            "confirmation_time_buckets": [
+                str(b) if math.isinf(b) else b for b in self.CONFIRMATION_BUCKETS
+            ],
+            "confirmation_time": list(self.confirmation_time),
+            "confirmation_time_sum": self.confirmation_time_sum,
+        }
+
+    @staticmethod
+    def _prometheus_histogram(name, labels, upper_bounds, counts, total_sum=None):
+        # "labels" is a list of 'key="value"' strings
+        def series(suffix, extra_labels=()):
+            all_labels = ",".join(list(labels) + list(extra_labels))
+            if not all_labels:
+                return f"{name}_{suffix}"
+            return f"{name}_{suffix}{{{all_labels}}}"
+
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(upper_bounds, counts):
+            cumulative += count
+            le = "+Inf" if math.isinf(upper_bound) else upper_bound
+            bucket = series("bucket", ['le="{}"'.format(le)])
+            lines.append(f"{bucket} {cumulative}")
+        if not math.isinf(upper_bounds[-1]):
+            bucket = series("bucket", ['le="+Inf"'])
+            lines.append(f"{bucket} {cumulative}")
+        if total_sum is not None:
+            lines.append(f"{series('sum')} {total_sum}")
+        lines.append(f"{series('count')} {cumulative}")
+        return lines
+
+    def to_prometheus(self, snapshot=None):
+        # A snapshot (by default of these counters) in the Prometheus text format
+        if snapshot is None:
+            snapshot = self.snapshot()
+        # Prometheus buckets are cumulative and labeled with their upper bound. A
+        # confidence bucket counts the probabilities lower than its bound (not lower
+        # or equal as usual), like the threshold check of the move detector
+        confidence_upper_bounds = snapshot["confidence_buckets"][1:] + [math.inf]
+        lines = [
+            "# HELP rps_detection_confidence Confidence of the best prediction, "
+            'le="x" buckets count confidences lower than x',
+            "# TYPE rps_detection_confidence histogram",
+        ]
+        for move, counts in snapshot["confidence"].items():
+            lines += self._prometheus_histogram(
+                "rps_detection_confidence",
+                [f'move="{move}"'],
+                confidence_upper_bounds,
+                counts,
+                snapshot["confidence_sum"][move],
+            )
+        lines += [
+            "# HELP rps_detection_rejected_total Frames under the threshold",
+            "# TYPE rps_detection_rejected_total counter",
+        ]
+        for move, rejected in snapshot["rejected"].items():
+            lines.append(f'rps_detection_rejected_total{{move="{move}"}} {rejected}')
+        lines += [
+            "# HELP rps_confirmation_seconds Time needed to confirm a move",
+            "# TYPE rps_confirmation_seconds histogram",
+        ]
+        lines += self._prometheus_histogram(
+            "rps_confirmation_seconds",
+            [],
+            [float(b) for b in snapshot["confirmation_time_buckets"]],
+            snapshot["confirmation_time"],
+            snapshot["confirmation_time_sum"],
+        )
+        return "\n".join(lines) + "\n"
+
+    def save(self, json_path, prometheus_path=None):
+        # Add the counters of this session to the saved ones, so calibration can use
+        # all the sessions. Call it once per session or counters are added twice
+        snapshot = self.snapshot()
+        if os.path.exists(json_path):
+            with open(json_path, "r") as f:
+                snapshot = merge_snapshots(json.load(f), snapshot)
+        with open(json_path, "w") as f:
+            json.dump(snapshot, f)
+        if prometheus_path is not None:
+            with open(prometheus_path, "w") as f:
+                f.write(self.to_prometheus(snapshot))
+
+
+def merge_snapshots(old, new):
+    """
+    Add the counters of two snapshots. If the buckets differ the old snapshot can't
+    be merged and is dropped
+    """
+    if (
+        old.get("confidence_buckets") != new["confidence_buckets"]
+        or old.get("confirmation_time_buckets") != new["confirmation_time_buckets"]
+    ):
+        return new
+
+    def add(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    merged = dict(new)
+    for key in ("confidence", "confirmed_confidence", "unconfirmed_confidence"):
+        merged[key] = {move: add(old[key][move], new[key][move]) for move in new[key]}
+    merged["confidence_sum"] = {
+        move: old.get("confidence_sum", {}).get(move, 0.0) + total
+        for move, total in new["confidence_sum"].items()
+    }
+    merged["rejected"] = {
+        move: old["rejected"][move] + n for move, n in new["rejected"].items()
+    }
+    merged["confirmation_time"] = add(
+        old["confirmation_time"], new["confirmation_time"]
+    )
+    merged["confirmation_time_sum"] = (
+        old["confirmation_time_sum"] + new["confirmation_time_sum"]
+    )
+    return merged
+
+
+def calibrate_thresholds(
+    snapshot,
+    sensibility=DEFAULT_SENSIBILITY,
+    min_threshold=50,
+    min_samples=100,
+    tolerance=0,
+):
+    """
+    Pick for every move the lowest threshold that doesn't accept more unconfirmed
+    frames (likely misdetections) than "sensibility" did, plus "tolerance". The
+    threshold is lowered only to buckets with confirmed frames, and only when at
+    least "min_samples" frames were seen between it and "sensibility"
+    """
+    buckets = snapshot["confidence_buckets"]
+    thresholds = {}
+    for move in MovesEnum:
+        name = move.name.lower()
+        confirmed = snapshot["confirmed_confidence"][name]
+        unconfirmed = snapshot["unconfirmed_confidence"][name]
+        thresholds[name] = sensibility
+        # Unconfirmed frames accepted by the default threshold
+        allowed = tolerance + sum(
+            n
+            for lower_bound, n in zip(buckets, unconfirmed)
+            if lower_bound >= sensibility
+        )
+        # Frames accepted by a threshold equal to a bucket lower bound
+        accepted_unconfirmed = 0
+        # Frames between that threshold and the default one
+        new_samples = 0
+        for i in range(len(buckets) - 1, -1, -1):
+            accepted_unconfirmed += unconfirmed[i]
+            if buckets[i] >= sensibility:
+                continue
+            if buckets[i] < min_threshold or accepted_unconfirmed > allowed:
+                break
+            new_samples += confirmed[i] + unconfirmed[i]
+            # Only thresholds with confirmed frames right above them are chosen
+            if confirmed[i] and new_samples >= min_samples:
+                thresholds[name] = buckets[i]
+    return thresholds
@@ -0,0 +1,94 @@
+import time
+
+from helpers.bot_strategy import (
+    BOT_REWARDS,
+    COUNTER_MOVES,
+    MOVES,
+    POINT_TABLE,
+    BotStrategySelector,
+)
+
+
+class SlowNextMovePredictor:
+    # Stub of NextMovePredictor that takes "delay" seconds to predict
+    def __init__(self, delay, move=1):
+        self.delay = delay
+        self.move = move
+        self.played_moves = []
+        self.calls = 0
+
+    def predict_next_move(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.move
+
+
+def play(selector, user_moves, next_move_predictor=None):
+    for user_move in user_moves:
+        selector.choose_move()
+        if next_move_predictor is not None:
+            next_move_predictor.played_moves.append(user_move)
+        selector.update(user_move)
+
+
+def test_lookup_tables_match_point_table():
+    for move in MOVES:
+        # The counter move makes the user lose
+        assert POINT_TABLE[move][COUNTER_MOVES[move]] == -1
+        for bot_move in MOVES:
+            assert BOT_REWARDS[move][bot_move] == -POINT_TABLE[move][bot_move]
+
+
+def test_hedge_weights_follow_winning_predictor():
+    selector = BotStrategySelector()
+    # A cycling user: Markov always wins, last move never does
+    play(selector, [0, 1, 2] * 10)
+    frequency, last_move, markov = selector.log_weights
+    assert markov > frequency
+    assert markov > last_move
+    # Once Markov leads, the bot plays its counter move
+    assert selector.choose_move() == COUNTER_MOVES[0]
+
+
+def test_late_prediction_is_dropped():
+    next_move_predictor = SlowNextMovePredictor(delay=0.05)
+    selector = BotStrategySelector(next_move_predictor, latency_budget=0.01)
+    play(selector, [0, 0, 0], next_move_predictor)
+    lstm = selector.predictors[-1]
+    # The estimate says it fits, but the prediction overruns the budget
+    lstm.estimated_time = 0.0
+    predictions = selector._vote(time.perf_counter())
+    assert predictions == [0, 0, 0, None]
+
+
+def test_budget_gone_falls_back_to_cheapest_predictor():
+    next_move_predictor = SlowNextMovePredictor(delay=0.0)
+    selector = BotStrategySelector(next_move_predictor, latency_budget=0.01)
+    play(selector, [0, 0, 0], next_move_predictor)
+    predictions = selector._vote(time.perf_counter() - 1)
+    assert predictions == [0, None, None, None]
+
+
+def test_over_budget_lstm_is_measured_with_backoff():
+    next_move_predictor = SlowNextMovePredictor(delay=0.01)
+    selector = BotStrategySelector(next_move_predictor, latency_budget=0.005)
+    rounds = 20
+    for round_number in range(rounds):
+        start = time.perf_counter()
+        selector.choose_move()
+        assert time.perf_counter() - start < 0.005
+        assert selector.last_predictions[-1] is None
+        next_move_predictor.played_moves.append(round_number % 3)
+        selector.update(round_number % 3)
+    # Measured after rounds 1, 3, 6, 11 and 20 instead of every round
+    assert next_move_predictor.calls == 5
+
+
+def test_lstm_is_retried_when_fast_enough():
+    next_move_predictor = SlowNextMovePredictor(delay=0.01)
+    selector = BotStrategySelector(next_move_predictor, latency_budget=0.005)
+    play(selector, [0] * 3, next_move_predictor)
+    next_move_predictor.delay = 0.0
+    play(selector, [0] * 3, next_move_predictor)
+    selector.choose_move()
+    assert selector.last_predictions[-1] == next_move_predictor.move
@@ -0,0 +1,142 @@
+import pytest
+
+from helpers.game_state import GameStateEnum, GameStateMachine
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def machine(clock):
+    return GameStateMachine(countdown_period=3, result_period=1, clock=clock)
+
+
+def advance(machine, clock, seconds):
+    # Move the clock one second at a time, updating the machine like the game cycle
+    for _ in range(seconds):
+        clock.now += 1
+        machine.update()
+
+
+def record_transitions(machine):
+    log = []
+    machine.on_countdown(lambda seconds: log.append(seconds))
+    for state in GameStateEnum:
+        machine.on_enter(state, lambda *args, state=state: log.append((state,) + args))
+    return log
+
+
+def test_countdown_starts_detection(machine, clock):
+    log = record_transitions(machine)
+    machine.start()
+    assert machine.state == GameStateEnum.COUNTDOWN
+    assert machine.time_to_next_event() == 1
+
+    advance(machine, clock, 2)
+    clock.now += 0.5
+    machine.update()
+    assert machine.state == GameStateEnum.COUNTDOWN
+    assert machine.countdown == 1
+
+    clock.now = 3.0
+    machine.update()
+    assert machine.state == GameStateEnum.DETECTING
+    assert machine.time_to_next_event() is None
+    assert log == [(GameStateEnum.COUNTDOWN,), 2, 1, 0, (GameStateEnum.DETECTING,)]
+
+
+def test_round_won_goes_back_to_countdown(machine, clock):
+    machine.on_enter(GameStateEnum.RESOLVING, lambda: machine.round_resolved(1))
+    machine.start()
+    advance(machine, clock, 3)
+    log = record_transitions(machine)
+
+    machine.move_confirmed()
+    assert machine.state == GameStateEnum.RESULT
+    assert log == [(GameStateEnum.RESOLVING,), (GameStateEnum.RESULT, 1)]
+
+    clock.now = 3.5
+    machine.update()
+    assert machine.state == GameStateEnum.RESULT
+
+    clock.now = 4.0
+    machine.update()
+    assert machine.state == GameStateEnum.COUNTDOWN
+    assert machine.countdown == 3
+    assert machine.time_to_next_event() == 1
+
+
+def test_round_lost_ends_the_game(machine, clock):
+    machine.on_enter(GameStateEnum.RESOLVING, lambda: machine.round_resolved(-1))
+    machine.start()
+    advance(machine, clock, 3)
+    machine.move_confirmed()
+    clock.now = 4.0
+    machine.update()
+    assert machine.state == GameStateEnum.GAME_OVER
+    assert machine.time_to_next_event() is None
+
+
+def test_callbacks_run_before_the_next_transition(machine, clock):
+    states_seen = []
+    machine.on_enter(GameStateEnum.RESOLVING, lambda: machine.round_resolved(0))
+    machine.on_enter(
+        GameStateEnum.RESOLVING, lambda: states_seen.append(machine.state)
+    )
+    machine.start()
+    advance(machine, clock, 3)
+    machine.move_confirmed()
+    assert states_seen == [GameStateEnum.RESOLVING]
+    assert machine.state == GameStateEnum.RESULT
+
+
+def test_events_out_of_their_state_are_ignored(machine, clock):
+    machine.move_confirmed()
+    machine.round_resolved(1)
+    assert machine.state == GameStateEnum.GAME_OVER
+
+    machine.start()
+    machine.start()
+    machine.round_resolved(1)
+    assert machine.state == GameStateEnum.COUNTDOWN
+
+    resolved = []
+    machine.on_enter(GameStateEnum.RESOLVING, lambda: resolved.append(True))
+    advance(machine, clock, 3)
+    machine.move_confirmed()
+    machine.move_confirmed()
+    assert resolved == [True]
+
+
+def test_invalid_transition_is_rejected(machine):
+    with pytest.raises(ValueError):
+        machine._transition(GameStateEnum.RESULT)
+    assert machine.state == GameStateEnum.GAME_OVER
+
+
+def test_stall_does_not_fire_missed_ticks_together(machine, clock):
+    log = record_transitions(machine)
+    machine.start()
+    # A 2.5s stall fires only one tick
+    clock.now = 2.5
+    machine.update()
+    assert log == [(GameStateEnum.COUNTDOWN,), 2]
+    assert machine.time_to_next_event() == 1
+
+    clock.now = 3.5
+    machine.update()
+    assert machine.countdown == 1
+    clock.now = 4.5
+    machine.update()
+    assert machine.state == GameStateEnum.DETECTING
+    assert log[1:] == [2, 1, 0, (GameStateEnum.DETECTING,)]
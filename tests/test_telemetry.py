@@ -0,0 +1,139 @@
+import json
+
+from helpers.moves import DEFAULT_SENSIBILITY, MovesEnum
+from helpers.telemetry import (
+    DetectionTelemetry,
+    calibrate_thresholds,
+    merge_snapshots,
+)
+
+
+def play_rounds(telemetry, frames, rounds=1, confirmed=MovesEnum.ROCK):
+    # frames is a list of (move, probability) recorded in every round
+    for _ in range(rounds):
+        telemetry.start_round()
+        for move, probability in frames:
+            accepted = probability >= DEFAULT_SENSIBILITY
+            telemetry.record_frame(move, probability, accepted)
+        telemetry.confirm_round(confirmed)
+    return telemetry.snapshot()
+
+
+def test_confidence_buckets_match_threshold_check():
+    telemetry = DetectionTelemetry(bin_width=5)
+    play_rounds(telemetry, [(MovesEnum.ROCK, 90), (MovesEnum.ROCK, 89.99)])
+    histogram = telemetry.confidence[MovesEnum.ROCK]
+    # 90 is accepted by a threshold of 90, so it's in the bucket starting at 90
+    assert histogram[telemetry.confidence_buckets.index(90)] == 1
+    assert histogram[telemetry.confidence_buckets.index(85)] == 1
+    play_rounds(telemetry, [(MovesEnum.ROCK, 100)])
+    assert histogram[-1] == 1
+
+
+def test_prometheus_histogram_is_cumulative():
+    lines = DetectionTelemetry._prometheus_histogram(
+        "metric", ['move="rock"'], [5, 10, 15], [1, 0, 2], total_sum=3.5
+    )
+    assert lines == [
+        'metric_bucket{move="rock",le="5"} 1',
+        'metric_bucket{move="rock",le="10"} 1',
+        'metric_bucket{move="rock",le="15"} 3',
+        'metric_bucket{move="rock",le="+Inf"} 3',
+        'metric_sum{move="rock"} 3.5',
+        'metric_count{move="rock"} 3',
+    ]
+
+
+def test_prometheus_histogram_without_labels():
+    lines = DetectionTelemetry._prometheus_histogram(
+        "metric", [], [1.0, float("inf")], [2, 1]
+    )
+    assert lines == [
+        'metric_bucket{le="1.0"} 2',
+        'metric_bucket{le="+Inf"} 3',
+        "metric_count 3",
+    ]
+
+
+def test_confidence_histogram_exports_sum():
+    telemetry = DetectionTelemetry()
+    play_rounds(telemetry, [(MovesEnum.ROCK, 95), (MovesEnum.ROCK, 82.5)])
+    text = telemetry.to_prometheus()
+    assert 'rps_detection_confidence_sum{move="rock"} 177.5' in text
+    assert 'rps_detection_confidence_count{move="rock"} 2' in text
+    # A confidence equal to a bound is counted in the bucket above it
+    assert 'rps_detection_confidence_bucket{move="rock",le="95"} 1' in text
+
+
+def test_calibration_defaults_to_detector_sensibility():
+    snapshot = DetectionTelemetry().snapshot()
+    assert calibrate_thresholds(snapshot) == {
+        move.name.lower(): DEFAULT_SENSIBILITY for move in MovesEnum
+    }
+
+
+def test_calibration_lowers_threshold_with_confirmed_frames():
+    telemetry = DetectionTelemetry()
+    snapshot = play_rounds(
+        telemetry,
+        [(MovesEnum.ROCK, 95), (MovesEnum.ROCK, 82), (MovesEnum.PAPER, 70)],
+        rounds=50,
+    )
+    thresholds = calibrate_thresholds(snapshot, min_samples=50)
+    assert thresholds["rock"] == 80
+    # No paper frame was ever confirmed
+    assert thresholds["paper"] == 90
+    assert thresholds["scissors"] == 90
+
+
+def test_calibration_does_not_lower_through_empty_buckets():
+    telemetry = DetectionTelemetry()
+    snapshot = play_rounds(
+        telemetry, [(MovesEnum.ROCK, 92), (MovesEnum.ROCK, 100)], rounds=50
+    )
+    assert calibrate_thresholds(snapshot)["rock"] == 90
+
+
+def test_calibration_requires_samples_in_accepted_range():
+    telemetry = DetectionTelemetry()
+    snapshot = play_rounds(
+        telemetry, [(MovesEnum.ROCK, 95)] * 10 + [(MovesEnum.ROCK, 87)], rounds=50
+    )
+    assert calibrate_thresholds(snapshot, min_samples=51)["rock"] == 90
+    assert calibrate_thresholds(snapshot, min_samples=50)["rock"] == 85
+
+
+def test_calibration_does_not_accept_more_unconfirmed_frames():
+    telemetry = DetectionTelemetry()
+    play_rounds(telemetry, [(MovesEnum.ROCK, 95), (MovesEnum.ROCK, 82)], rounds=50)
+    snapshot = play_rounds(
+        telemetry, [(MovesEnum.ROCK, 87)], rounds=1, confirmed=MovesEnum.PAPER
+    )
+    # The rock frame at 87 was not confirmed: lowering to 85 would accept it
+    assert calibrate_thresholds(snapshot, min_samples=50)["rock"] == 90
+    assert calibrate_thresholds(snapshot, min_samples=50, tolerance=1)["rock"] == 80
+
+
+def test_save_adds_sessions(tmp_path):
+    json_path = tmp_path / "telemetry.json"
+    prometheus_path = tmp_path / "telemetry.prom"
+    for _ in range(2):
+        telemetry = DetectionTelemetry(clock=lambda: 0.0)
+        play_rounds(telemetry, [(MovesEnum.ROCK, 95), (MovesEnum.PAPER, 50)])
+        telemetry.save(str(json_path), str(prometheus_path))
+
+    snapshot = json.loads(json_path.read_text())
+    assert sum(snapshot["confirmed_confidence"]["rock"]) == 2
+    assert sum(snapshot["unconfirmed_confidence"]["paper"]) == 2
+    assert snapshot["rejected"]["paper"] == 2
+    assert snapshot["confidence_sum"]["rock"] == 190
+    assert snapshot["confirmation_time"][0] == 2
+    assert 'rps_detection_confidence_count{move="rock"} 2' in (
+        prometheus_path.read_text()
+    )
+
+
+def test_merge_drops_snapshot_with_other_buckets():
+    old = DetectionTelemetry(bin_width=10).snapshot()
+    new = play_rounds(DetectionTelemetry(), [(MovesEnum.ROCK, 95)])
+    assert merge_snapshots(old, new) == new